@@ -1,26 +1,35 @@
-from collections import Counter, deque
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import json
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+import itertools
 import logging
 import os.path
 from pathlib import Path
 import random
+import sqlite3
 from ssl import SSLError
+import threading
 import time
-from typing import Optional
+from typing import Iterator, Optional, Union
+from urllib.parse import quote
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import BatchHttpRequest
+from googleapiclient.http import BatchHttpRequest, build_http
+from googleapiclient.model import JsonModel
+import orjson
 import pandas as pd
 
-# Retrieve JSON config file.
+# Retrieve JSON config file from the module's directory (rather than the current working directory).
 root_dir = Path(Path(__file__).parent)
-with open("config.json", encoding = "utf8") as json_data_file:
-    config = json.load(json_data_file)
+config = orjson.loads((root_dir / "config.json").read_bytes())
 
 # Parse config and initialize global variables
 # Authentication
@@ -32,11 +41,33 @@ DEFAULTSCOPES = config["authentication"]["default_scopes"]
 SOURCE_FOLDER_ID = config["drive"]["source_folder_id"]
 DESTINATION_FOLDER_ID = config["drive"]["destination_folder_id"]
 
+# Google Drive mime type for folders
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+# Maximum URL-encoded length of the combined parent clauses in a listing query, leaving room for the rest of the
+# request URL under Google's 8KB request line limit
+MAX_PARENTS_QUERY_LENGTH = 6000
+
 # Performance
 MAX_RECURSION_DEPTH = config["performance"]["max_recursion_depth"]
 MAX_RETRIES = config["performance"]["max_retries"]
+BACKOFF_BASE_DELAY = config["performance"]["backoff_base_delay"]
+MAX_BACKOFF_DELAY = config["performance"]["max_backoff_delay"]
+LIST_BATCH_SIZE = config["performance"]["list_batch_size"]
+PAGE_SIZE = min(config["performance"]["page_size"], 1000)  # Drive API maximum page size
+PARENTS_PER_QUERY = config["performance"]["parents_per_query"]
 BATCH_SIZE = config["performance"]["batch_size"]
 MAX_WORKERS = config["performance"]["max_workers"]
+MAX_REQUESTS_PER_SECOND = config["performance"]["max_requests_per_second"]
+MAX_REQUEST_BURST = config["performance"]["max_request_burst"]
+
+# Maximum number of copy batches to queue for the copy workers before waiting for them to catch up (enough to keep
+# every worker busy while the next batches are listed)
+MAX_QUEUED_BATCHES = MAX_WORKERS * 2
+
+# Listing cache
+LISTING_CACHE_TTL = config["cache"]["listing_cache_ttl"]
+LISTING_CACHE_FILEPATH = config["cache"]["listing_cache_filepath"]
 
 # Logging
 LOG_FILE_ENABLED = config["logging"]["log_file_enabled"]
@@ -61,11 +92,108 @@ if LOG_FILE_ENABLED:
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
+# Field mask for copy/create responses; names are only requested back when the per-item DEBUG messages will be logged
+_COPY_FIELDS = 'id, name, mimeType' if min(handler.level for handler in logger.handlers) <= logging.DEBUG else 'id, mimeType'
+
+# Cached credentials and (credentials, service) pair, reused across calls
+_CREDS_CACHE = None
+_SERVICE_CACHE = None
+_SERVICE_LOCK = threading.Lock()
+
+# Thread-local storage for per-thread HTTP connections
+_thread_local = threading.local()
+
+# Shared worker pools for folder listings and copy batches, kept alive between calls so each worker's HTTP connection
+# is reused (separate pools so copy workers never wait on listings queued behind them)
+_LIST_EXECUTOR = ThreadPoolExecutor(max_workers = MAX_WORKERS, thread_name_prefix = 'list')
+_COPY_EXECUTOR = ThreadPoolExecutor(max_workers = MAX_WORKERS, thread_name_prefix = 'copy')
+
+# Internal token bucket used to pace requests to the Google Drive API.
+class _TokenBucket:
+    '''
+    Internal token bucket used to pace requests to the Google Drive API across all worker threads. Tokens are added at a
+    fixed rate up to a maximum burst capacity, and each request must acquire a token before being sent, so the client
+    stays under the API's rate limits instead of triggering rate limit errors and backing off after the fact.
+    '''
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def acquire(self, count: int = 1) -> None:
+        '''
+        Block until the given number of tokens are available, then consume them. Tokens are consumed in steps of at most
+        the bucket's capacity, so a count larger than the capacity is paced at the fixed rate rather than waiting forever.
+
+        Args:
+            count: The number of tokens to consume (one per request).
+        '''
+
+        with self._condition:
+            while count > 0:
+                step = min(count, self.capacity)
+
+                # Add the tokens accrued since the last update, up to the bucket's capacity
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= step:
+                    self._tokens -= step
+                    count -= step
+                    continue
+
+                # Wait (releasing the lock for other threads) until enough tokens should be available
+                self._condition.wait((step - self._tokens) / self.rate)
+
+# Shared pacer for all requests to the Google Drive API
+_PACER = _TokenBucket(rate = MAX_REQUESTS_PER_SECOND, capacity = MAX_REQUEST_BURST)
+
+# Internal JSON model that decodes Google Drive API responses with orjson.
+class _OrjsonModel(JsonModel):
+    '''
+    Internal JSON model that decodes Google Drive API responses with `orjson`, which is considerably faster than the
+    standard library `json` module for large listing pages. Requests are still serialized by the base `JsonModel`.
+    '''
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Return undecodable content as-is, as the base model does, without parsing it a second time
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
+# Internal function to determine whether credentials were granted all of the specified scopes.
+def _has_scopes(creds: Credentials, scopes: list) -> bool:
+    '''
+    Internal function to determine whether the Google OAuth credentials were granted all of the specified scopes.
+
+    Args:
+        creds: The Google OAuth credentials to check.
+        scopes: The list of scopes that are required.
+
+    Returns:
+        True if the credentials include every scope, otherwise False.
+    '''
+
+    granted_scopes = creds.scopes or []
+    return all(scope in granted_scopes for scope in scopes)
+
 # Internal function to initialize the Google OAuth connection.
 def _init_google_oauth(scopes: list = DEFAULTSCOPES) -> Credentials:
     '''
     Internal function to initialize the Google OAuth connection using the provided credentials/token.
 
+    The credentials are cached for the life of the process, so the token file is only read on first use and only
+    rewritten when the token is actually refreshed or a new one is obtained.
+
     Args:
         scopes: The list of scopes to request access to.
     
@@ -76,10 +204,15 @@ def _init_google_oauth(scopes: list = DEFAULTSCOPES) -> Credentials:
         Exception: An error occurred during the OAuth flow.
         Exception: An error occurred while saving the token.
     '''
+    global _CREDS_CACHE
 
-    # Load the credentials from the file.
-    creds = None
-    if os.path.exists(TOKEN_FILEPATH):
+    # Reuse the cached credentials if they're still valid and contain the desired scope(s).
+    creds = _CREDS_CACHE
+    if creds and creds.valid and _has_scopes(creds, scopes):
+        return creds
+
+    # Otherwise, load the credentials from the file.
+    if not creds and os.path.exists(TOKEN_FILEPATH):
         try:
             creds = Credentials.from_authorized_user_file(TOKEN_FILEPATH)
         except Exception as e:
@@ -87,9 +220,9 @@ def _init_google_oauth(scopes: list = DEFAULTSCOPES) -> Credentials:
             raise
 
     # If there are no (valid) credentials available or existing scopes don't contain desired scope(s).
-    if not creds or not creds.valid or not all(scope in creds.scopes for scope in scopes):
+    if not creds or not creds.valid or not _has_scopes(creds, scopes):
         # If only issue is that the credentials are expired, refresh them.
-        if creds and creds.expired and creds.refresh_token and all(scope in creds.scopes for scope in scopes):
+        if creds and creds.expired and creds.refresh_token and _has_scopes(creds, scopes):
             creds.refresh(Request())
         else:
             try:
@@ -103,27 +236,188 @@ def _init_google_oauth(scopes: list = DEFAULTSCOPES) -> Credentials:
         
         # Save the credentials for the next run
         try:
-            with open("token.json", "w") as token:
+            with open(TOKEN_FILEPATH, "w") as token:
                 token.write(creds.to_json())
         except Exception as e:
             logger.error(f"An error occurred while saving your token: {e}")
             raise
-    
+
+    _CREDS_CACHE = creds
     return creds
 
-# Internal function to list items in the specified Google Drive folder.
-def _list_items(service: build, folder_id: str, depth: int = 0, recursive: Optional[bool] = None) -> list:
+# Internal function to retrieve the Google Drive API service.
+def _get_service(scopes: list = DEFAULTSCOPES) -> build:
     '''
-    Internal function to list items in the specified Google Drive folder.
+    Internal function to retrieve the Google Drive API service, building it only when the credentials change. The
+    cached service is shared by all of the assessment functions, and access to it is serialized so that concurrent
+    callers never trigger more than one OAuth flow or service build.
 
     Args:
-        service: The Google Drive API service.
-        folder_id: The ID of the Google Drive folder to list.
-        depth: The current depth when listing items recursively.
-        recursive: A flag to indicate whether to list items recursively.
+        scopes: The list of scopes to request access to.
 
     Returns:
-        A list of items in the source Google Drive folder.
+        The Google Drive API service.
+    '''
+    global _SERVICE_CACHE
+
+    with _SERVICE_LOCK:
+        creds = _init_google_oauth(scopes)
+        if _SERVICE_CACHE is None or _SERVICE_CACHE[0] is not creds:
+            _SERVICE_CACHE = (creds, build("drive", "v3", credentials = creds, model = _OrjsonModel(), static_discovery = True, cache_discovery = False))
+
+        return _SERVICE_CACHE[1]
+
+# Internal function to retrieve an authorized HTTP connection for the current thread.
+def _get_thread_http(creds: Credentials) -> AuthorizedHttp:
+    '''
+    Internal function to retrieve an authorized HTTP connection for the current thread, creating one if needed.
+
+    The underlying `httplib2.Http` objects are not thread-safe, so each worker thread needs its own connection. These
+    are created the same way as the client library's default connection (with its socket timeout), so a stalled
+    connection fails the listing or copy batch it's carrying instead of blocking its worker indefinitely.
+
+    Args:
+        creds: The Google OAuth credentials used to authorize requests.
+
+    Returns:
+        An authorized HTTP connection owned by the current thread.
+    '''
+
+    http = getattr(_thread_local, 'http', None)
+    if http is None or http.credentials is not creds:
+        http = AuthorizedHttp(creds, http = build_http())
+        _thread_local.http = http
+
+    return http
+
+# Internal function to execute a batch request on the current thread's HTTP connection.
+def _execute_batch(batch: BatchHttpRequest, creds: Credentials) -> None:
+    '''
+    Internal function to execute a batch request on the current thread's own authorized HTTP connection, so that batch
+    requests running in parallel worker threads don't share (and contend for) a single connection. The batch waits for
+    the shared pacer to grant one token per request it contains, since each counts against the API's rate limits.
+
+    Args:
+        batch: The batch request to execute.
+        creds: The Google OAuth credentials used to authorize requests.
+
+    Raises:
+        HttpError: An error occurred accessing the Google Drive API.
+    '''
+
+    _PACER.acquire(len(batch._order))
+    batch.execute(http = _get_thread_http(creds))
+
+# Internal function to determine whether a Google Drive API error is transient.
+def _is_retryable_error(error: HttpError) -> bool:
+    '''
+    Internal function to determine whether a Google Drive API error is transient and the request can be retried.
+
+    Args:
+        error: The HTTP error returned by the Google Drive API.
+
+    Returns:
+        True if the error is a rate limit or transient server error, otherwise False.
+    '''
+
+    if error.resp.status in [429, 500, 502, 503, 504]:
+        return True
+    if error.resp.status == 403:
+        # Match the reason against the raw response body rather than decoding it first
+        return b'rateLimitExceeded' in error.content or b'userRateLimitExceeded' in error.content
+
+    return False
+
+# Internal function to calculate the delay before retrying a failed request.
+def _get_backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    '''
+    Internal function to calculate the delay before retrying a failed request, using capped exponential backoff with
+    full jitter (a random delay between zero and the backoff ceiling, which spreads out retries from parallel workers)
+    and honoring any `Retry-After` header returned by the Google Drive API.
+
+    Args:
+        attempt: The number of the attempt that failed (starting at 0).
+        error: The error that caused the attempt to fail.
+
+    Returns:
+        The number of seconds to wait before retrying.
+    '''
+
+    delay = random.uniform(0, min(MAX_BACKOFF_DELAY, BACKOFF_BASE_DELAY * (2 ** attempt)))
+
+    # If the server specified how long to wait, don't retry any sooner than that
+    if isinstance(error, HttpError):
+        retry_after = error.resp.get('retry-after')
+        if retry_after:
+            # The header is either a number of seconds or an HTTP date to retry after
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                try:
+                    delay = max(delay, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+                except (TypeError, ValueError):
+                    logger.debug(f"Ignoring unrecognized Retry-After header: {retry_after}")
+
+    return delay
+
+# Internal function to log a failed listing request and determine whether it can be retried.
+def _handle_list_error(error: Exception) -> bool:
+    '''
+    Internal function to log an error that occurred while listing items and determine whether it is transient.
+
+    Args:
+        error: The exception raised by the listing request.
+
+    Returns:
+        True if the error is transient and the listing should be retried, otherwise False.
+    '''
+
+    if isinstance(error, HttpError) and _is_retryable_error(error):
+        if error.resp.status in [403, 429]:
+            logger.error("Rate limit exceeded. Retrying after a delay...")
+        else:
+            logger.error(f"An HTTP error occurred: {error}. Retrying...")
+    elif isinstance(error, SSLError):
+        logger.error(f"An SSL error occurred: {error}. Retrying...")
+    elif isinstance(error, TimeoutError):
+        logger.error(f"A timeout occurred: {error}. Retrying...")
+    elif isinstance(error, ValueError):
+        logger.error(f"An unexpected response type error occurred: {error}. Retrying...")
+    else:
+        logger.error(f"An error occurred: {error}")
+        return False
+
+    return True
+
+# Internal generator to iterate over items in the specified Google Drive folder.
+def _iter_items(service: build, folder_id: Union[str, list], recursive: Optional[bool] = None, fields: str = "nextPageToken, files(name, id, mimeType)", query: Optional[str] = None, file_fields: Optional[str] = None, order_by: Optional[str] = None, start_depth: int = 0) -> Iterator[dict]:
+    '''
+    Internal generator to iterate over items in the specified Google Drive folder, yielding them as pages arrive.
+
+    Folder listings are queued and dispatched together as batch HTTP requests (up to `LIST_BATCH_SIZE` listings per
+    round-trip), with nested folders and follow-up pages being added to the queue as responses arrive. Multiple folders
+    are listed with a single query (up to `PARENTS_PER_QUERY` folders combined with `or`), so request `parents` in
+    `fields` when the items need to be matched back to their folder. Up to `MAX_WORKERS` batch requests are kept in
+    flight at once, each on its own worker thread and HTTP connection, and newly queued listings are dispatched as soon
+    as any batch completes. Items are yielded as batches complete, so only the pages received since the last yield are
+    held in memory, and a folder is always yielded before any of its nested items.
+
+    Args:
+        service: The Google Drive API service.
+        folder_id: The ID of the Google Drive folder to list, or a list of folder IDs to list together.
+        recursive: A flag to indicate whether to list items recursively.
+        fields: The partial response field mask to request for each page. Must include `nextPageToken` (or pagination
+            silently stops after the first page) and `mimeType`, plus `id` when listing recursively.
+        query: An optional query clause to filter the listed items by (e.g. `mimeType = '...'`).
+        file_fields: An optional, smaller field mask to request for the non-folder items when listing recursively
+            (which are listed separately from the folders). Must include `nextPageToken` and `mimeType`. Defaults to
+            `fields`.
+        order_by: An optional sort order for the listed items (e.g. `folder` to list folders before files).
+        start_depth: The recursion depth of the listed folder(s), counted toward `MAX_RECURSION_DEPTH` (e.g. `-1` so the
+            depth limit applies from the folders nested directly under them).
+
+    Yields:
+        Each item in the source Google Drive folder.
 
     Raises:
         HttpError: An error occurred accessing the Google Drive API.
@@ -132,274 +426,517 @@ def _list_items(service: build, folder_id: str, depth: int = 0, recursive: Optio
         ValueError: An unexpected response type was received.
     '''
 
-    if depth > MAX_RECURSION_DEPTH:
-        logger.warning(f"Max recursion depth reached for folder: {folder_id}")
-        return []
+    creds = service._http.credentials
+    files_resource = service.files()
+    files_list = files_resource.list
+    files_list_next = files_resource.list_next
+    lock = threading.Lock()
+
+    # Function to build the (query, field mask) pairs to list a group of folders with. When listing recursively, folders
+    # and files are listed with separate queries so nested folders are discovered from a small response rather than
+    # after every page of files, and the files can be listed with a smaller field mask.
+    def folder_queries(list_folder_ids):
+        folder_query = " or ".join(f"'{list_folder_id}' in parents" for list_folder_id in list_folder_ids)
+        if len(list_folder_ids) > 1:
+            folder_query = f"({folder_query})"
+        folder_query = f"{folder_query} and trashed=false"
+        if query:
+            folder_query = f"{folder_query} and {query}"
+        if recursive:
+            return [(f"{folder_query} and mimeType = '{FOLDER_MIME}'", fields), (f"{folder_query} and mimeType != '{FOLDER_MIME}'", file_fields or fields)]
+        return [(folder_query, fields)]
+
+    # Function to queue listings for a list of folders, combining up to PARENTS_PER_QUERY folders in each query (fewer
+    # if the combined query would exceed MAX_PARENTS_QUERY_LENGTH once URL-encoded). Folders that have already been
+    # queued (e.g. a folder with multiple parents that are both being listed) are skipped, so no folder is listed twice.
+    def queue_folders(list_folder_ids, list_depth):
+        list_folder_ids = [list_folder_id for list_folder_id in dict.fromkeys(list_folder_ids) if list_folder_id not in queued_folder_ids]
+        queued_folder_ids.update(list_folder_ids)
+        group = []
+        group_length = 0
+        for list_folder_id in list_folder_ids:
+            clause_length = len(quote(f"'{list_folder_id}' in parents or "))
+            if group and (len(group) >= PARENTS_PER_QUERY or group_length + clause_length > MAX_PARENTS_QUERY_LENGTH):
+                pending.extend((group, list_query, list_fields, list_depth, None, 0) for list_query, list_fields in folder_queries(group))
+                group = []
+                group_length = 0
+            group.append(list_folder_id)
+            group_length += clause_length
+        if group:
+            pending.extend((group, list_query, list_fields, list_depth, None, 0) for list_query, list_fields in folder_queries(group))
+
+    # Work queue of pending listings, stored as (folder IDs, query, field mask, depth, request, attempt) tuples, where the request is
+    # None until the first page is requested. Nested folders are appended to the queue rather than recursed into, so
+    # depth is only bounded by MAX_RECURSION_DEPTH.
+    pending = deque()
+    queued_folder_ids = set()
+    queue_folders([folder_id] if isinstance(folder_id, str) else list(folder_id), start_depth)
+
+    # Shared state for in-flight listings, updated by the batch callbacks on the worker threads
+    entries_by_request_id = {}
+    request_ids = itertools.count()
+    listed_items = []
+    failed_entries = []
+    fatal_errors = []
+
+    # Callback function to handle each listing response in a batch
+    def handle_list_response(request_id, response, exception):
+        with lock:
+            entry = entries_by_request_id.pop(request_id)
+            list_folder_ids, list_query, list_fields, list_depth, list_request, _ = entry
+
+            # Ensure the response is a dictionary (the client returns the raw body as a string when it isn't valid JSON,
+            # e.g. an HTML error page from a proxy), treating anything else as a transient error
+            if exception is None and not isinstance(response, dict):
+                exception = ValueError(f"Unexpected response type: {type(response)}")
 
-    items = []
-    page_token = None
-    query = f"'{folder_id}' in parents and trashed=false"
-
-    # Retry loop to handle transient errors
-    for attempt in range(MAX_RETRIES):
-        try:
-            # While loop to handle pagination of returned items
-            while True:
-                response = (
-                    service.files().list(
-                        q = query,
-                        spaces = "drive",
-                        corpora = "user",
-                        fields = "nextPageToken, files(name, id, mimeType)",
-                        pageToken = page_token,
-                    ).execute()
-                )
-                
-                # Ensure the response is a dictionary (sometimes a string is returned?)
-                if not isinstance(response, dict):
-                    raise ValueError(f"Unexpected response type: {type(response)}")
-                
-                files = response.get('files', [])
-                items.extend(files)
-
-                # If recursive flag is set and max depth is not reached, call recursively on folders
-                if recursive and depth < MAX_RECURSION_DEPTH:
-                    for file in files:
-                        if file['mimeType'] == 'application/vnd.google-apps.folder':
-                            items.extend(_list_items(service, file['id'], depth + 1, recursive))
-
-                # Check if there are more pages to retrieve
-                page_token = response.get("nextPageToken", None)
-                if page_token is None:
-                    break
-            
-            return items
-
-        except (HttpError, SSLError, TimeoutError, ValueError) as error:
-            if isinstance(error, HttpError) and error.resp.status in [403, 500, 503]:
-                if 'rateLimitExceeded' in error.content.decode('utf-8'):
-                    logger.error("Rate limit exceeded. Retrying after a delay...")
+            if exception:
+                if _handle_list_error(exception):
+                    failed_entries.append((entry, exception))
                 else:
-                    logger.error(f"An HTTP error occurred: {error}. Retrying...")
-            elif isinstance(error, SSLError):
-                logger.error(f"An SSL error occurred: {error}. Retrying...")
-            elif isinstance(error, TimeoutError):
-                logger.error(f"A timeout occurred: {error}. Retrying...")
-            elif isinstance(error, ValueError):
-                logger.error(f"An unexpected response type error occurred: {error}. Retrying...")
-            else:
-                logger.error(f"An error occurred: {error}")
-                break
+                    fatal_errors.append(exception)
+                return
 
-            time.sleep((2 ** attempt) + random.random())
+            files = response.get('files', [])
+            listed_items.extend(files)
 
-    raise TimeoutError(f"Failed to list items in folder {folder_id} after {MAX_RETRIES} attempts")
+            # If recursive flag is set, queue nested folders for listing
+            if recursive:
+                child_folder_ids = [file['id'] for file in files if file['mimeType'] == FOLDER_MIME]
+                if list_depth < MAX_RECURSION_DEPTH:
+                    queue_folders(child_folder_ids, list_depth + 1)
+                else:
+                    for child_folder_id in child_folder_ids:
+                        logger.warning(f"Max recursion depth reached for folder: {child_folder_id}")
+
+            # If there are more pages to retrieve, queue the request for the next page
+            next_request = files_list_next(list_request, response)
+            if next_request is not None:
+                pending.append((list_folder_ids, list_query, list_fields, list_depth, next_request, 0))
+
+    # Function to create a batch request for up to the configured number of pending listings
+    def create_batch_request():
+        batch = service.new_batch_http_request(callback = handle_list_response)
+        batch_request_ids = []
+        for _ in range(min(LIST_BATCH_SIZE, len(pending))):
+            list_folder_ids, list_query, list_fields, list_depth, list_request, attempt = pending.popleft()
+            if list_request is None:
+                list_request = files_list(
+                    q = list_query,
+                    spaces = "drive",
+                    corpora = "user",
+                    fields = list_fields,
+                    pageSize = PAGE_SIZE,
+                    orderBy = order_by,
+                )
+            request_id = str(next(request_ids))
+            entries_by_request_id[request_id] = (list_folder_ids, list_query, list_fields, list_depth, list_request, attempt)
+            batch_request_ids.append(request_id)
+            batch.add(list_request, request_id = request_id)
+        return batch, batch_request_ids
+
+    # Keep up to MAX_WORKERS batch requests in flight on the shared listing workers, dispatching newly queued listings
+    # (nested folders and follow-up pages) as soon as any batch completes
+    in_flight = {}
+    while pending or in_flight:
+        with lock:
+            while pending and len(in_flight) < MAX_WORKERS:
+                batch, batch_request_ids = create_batch_request()
+                in_flight[_LIST_EXECUTOR.submit(_execute_batch, batch, creds)] = batch_request_ids
+
+        done, _ = wait(in_flight, return_when = FIRST_COMPLETED)
+
+        # Handle transient errors that affect a whole batch request
+        for future in done:
+            batch_request_ids = in_flight.pop(future)
+            try:
+                future.result()
+            except (HttpError, SSLError, TimeoutError) as error:
+                if not _handle_list_error(error):
+                    raise
+                with lock:
+                    failed_entries.extend((entries_by_request_id.pop(request_id), error) for request_id in batch_request_ids)
+
+        # Take the items and failures collected so far, and yield the items
+        with lock:
+            if fatal_errors:
+                raise fatal_errors[0]
+            collected_items = listed_items[:]
+            listed_items.clear()
+            collected_failures = failed_entries[:]
+            failed_entries.clear()
+
+        yield from collected_items
+
+        # Re-queue failed listings after a delay, giving up once the maximum number of retries is reached
+        if collected_failures:
+            for (list_folder_ids, _, _, _, _, attempt), _ in collected_failures:
+                if attempt + 1 >= MAX_RETRIES:
+                    raise TimeoutError(f"Failed to list items in folder(s) {', '.join(list_folder_ids)} after {MAX_RETRIES} attempts")
+
+            time.sleep(max(_get_backoff_delay(entry[5], error) for entry, error in collected_failures))
+
+            with lock:
+                pending.extend((list_folder_ids, list_query, list_fields, list_depth, list_request, attempt + 1) for (list_folder_ids, list_query, list_fields, list_depth, list_request, attempt), _ in collected_failures)
 
-# Internal function to copy items from the source Google Drive folder to the destination Google Drive folder.
-def _copy_items(service: build, source_folder_id: str, destination_folder_id: str, depth: int = 0, recursive: Optional[bool] = None):
+# Internal function to list items in the specified Google Drive folder.
+def _list_items(service: build, folder_id: Union[str, list], recursive: Optional[bool] = None, fields: str = "nextPageToken, files(name, id, mimeType)") -> list:
     '''
-    Internal function to copy items from the source Google Drive folder to the destination Google Drive folder.
+    Internal function to list items in the specified Google Drive folder.
 
     Args:
         service: The Google Drive API service.
-        source_folder_id: The ID of the source Google Drive folder.
-        destination_folder_id: The ID of the destination Google Drive folder.
-        depth: The current depth when copying items recursively.
-        recursive: A flag to indicate whether to copy items recursively.
+        folder_id: The ID of the Google Drive folder to list, or a list of folder IDs to list together.
+        recursive: A flag to indicate whether to list items recursively.
+        fields: The partial response field mask to request for each page (see `_iter_items()`).
 
     Returns:
-        A dictionary containing the number of files and folders copied.
+        A list of items in the source Google Drive folder.
 
     Raises:
         HttpError: An error occurred accessing the Google Drive API.
+        SSLError: An SSL error occurred.
+        TimeoutError: A timeout occurred while accessing the Google Drive API.
+        ValueError: An unexpected response type was received.
     '''
-    
-    if depth > MAX_RECURSION_DEPTH:
-        logger.warning(f"Max recursion depth reached for folder: {source_folder_id}")
-        return {'copied_folder_count': 0, 'copied_file_count': 0}
 
-    items = _list_items(service, source_folder_id)
-    copied_folder_count = 0
-    copied_file_count = 0
-    folder_id_map = {}
+    return list(_iter_items(service, folder_id, recursive, fields))
 
-    # Callback function to handle each batch response
-    def handle_batch_response(request_id, response, exception):
-        nonlocal copied_file_count, copied_folder_count
-        if exception:
-            logger.error(f"An error occurred: {exception}")
-        else:
-            if 'mimeType' in response and response['mimeType'] == 'application/vnd.google-apps.folder':
-                copied_folder_count += 1
-                folder_id_map[request_id] = response['id']
-                logger.info(f"Folder copied: {response['name']} with new ID: {response['id']}")
-            else:
-                copied_file_count += 1
-                logger.info(f"File copied: {response['name']} with new ID: {response['id']}")
-
-    # Function to create a batch request for item copy operations
-    def create_batch_request(items):
-        batch = service.new_batch_http_request(callback = handle_batch_response)
-        for item in items:
-            if item['mimeType'] == 'application/vnd.google-apps.folder':
-                folder_metadata = {
-                    'name': item['name'],
-                    'mimeType': 'application/vnd.google-apps.folder',
-                    'parents': [destination_folder_id]
-                }
-                batch.add(service.files().create(body = folder_metadata, fields = 'id, name, mimeType'), request_id = item['id'])
-            else:
-                file_metadata = {
-                    'name': item['name'],
-                    'parents': [destination_folder_id]
-                }
-                batch.add(service.files().copy(fileId = item['id'], body = file_metadata, fields='id, name, mimeType'), request_id = item['id'])
-        return batch
+# Internal generator to iterate over items in the specified Google Drive folder, reusing a recently cached listing.
+def _iter_cached_items(service: build, folder_id: Union[str, list], recursive: Optional[bool] = None, fields: str = "nextPageToken, files(name, id, mimeType)", query: Optional[str] = None, file_fields: Optional[str] = None, start_depth: int = 0) -> Iterator[dict]:
+    '''
+    Internal generator to iterate over items in the specified Google Drive folder, reusing the results of an identical
+    listing from a previous run if it was cached less than `LISTING_CACHE_TTL` seconds ago.
 
-    # If number of items exceeds configured batch size, split items into chunks for processing
-    if len(items) > BATCH_SIZE:
-        item_chunks = [items[i:i + BATCH_SIZE] for i in range(0, len(items), BATCH_SIZE)]
-    else:
-        item_chunks = [items]
+    Fresh listings are streamed from `_iter_items()` as usual. When caching is enabled, their items are also kept and
+    stored in the SQLite database at `LISTING_CACHE_FILEPATH` once the listing completes (so a listing that's abandoned
+    part-way through is never cached).
+
+    Args:
+        service: The Google Drive API service.
+        folder_id: The ID of the Google Drive folder to list, or a list of folder IDs to list together.
+        recursive: A flag to indicate whether to list items recursively.
+        fields: The partial response field mask to request for each page (see `_iter_items()`).
+        query: An optional query clause to filter the listed items by.
+        file_fields: An optional, smaller field mask to request for the non-folder items (see `_iter_items()`).
+        start_depth: The recursion depth of the listed folder(s) (see `_iter_items()`).
 
-    # Process each chunk in parallel using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers = MAX_WORKERS) as executor:
-        futures = [executor.submit(create_batch_request(chunk).execute) for chunk in item_chunks]
+    Yields:
+        Each item in the source Google Drive folder.
 
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except HttpError as error:
-                if 'rateLimitExceeded' in error.content.decode('utf-8'):
-                    logger.warning("Rate limit exceeded. Retrying after a delay...")
-                    time.sleep(1)
-                else:
-                    logger.error(f"An error occurred: {error}")
+    Raises:
+        HttpError: An error occurred accessing the Google Drive API.
+        SSLError: An SSL error occurred.
+        TimeoutError: A timeout occurred while accessing the Google Drive API.
+        ValueError: An unexpected response type was received.
+    '''
 
-    # Ensure all futures have completed
-    for future in futures:
-        future.result()
+    if LISTING_CACHE_TTL <= 0:
+        yield from _iter_items(service, folder_id, recursive, fields, query, file_fields, start_depth = start_depth)
+        return
 
-    # Recursively copy items in the folder if requested
-    if recursive and depth < MAX_RECURSION_DEPTH:
-        logger.debug(f"Recursion enabled, checking for nested folders")
-        for item in items:
-            if item['mimeType'] == 'application/vnd.google-apps.folder':
-                logger.debug(f"Item {item['name']} is a folder, copying nested items")
-                new_folder_id = folder_id_map.get(item['id'])
-                if new_folder_id:
-                    logger.debug(f"New folder ID retrieved, copying nested items to folder: {new_folder_id}")
-                    nested_copy = _copy_items(service, item['id'], new_folder_id, depth + 1, recursive = True)
-                    copied_folder_count += nested_copy['copied_folder_count']
-                    copied_file_count += nested_copy['copied_file_count']
+    # Cached listings are keyed by every argument that affects the results
+    key = orjson.dumps([folder_id, bool(recursive), fields, query, file_fields, start_depth]).decode('utf-8')
+    with closing(sqlite3.connect(LISTING_CACHE_FILEPATH)) as connection:
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS listings (key TEXT PRIMARY KEY, fetched_at REAL NOT NULL, items BLOB NOT NULL)")
+        row = connection.execute("SELECT fetched_at, items FROM listings WHERE key = ?", (key,)).fetchone()
 
-    return {'source_folder_id': source_folder_id, 'destination_folder_id': destination_folder_id, 'copied_file_count': copied_file_count, 'copied_folder_count': copied_folder_count}
+    if row is not None and time.time() - row[0] < LISTING_CACHE_TTL:
+        logger.debug(f"Using cached listing from {time.time() - row[0]:.0f} seconds ago for folder(s): {folder_id}")
+        yield from orjson.loads(row[1])
+        return
+
+    # Stream the fresh listing while keeping a copy of its items, caching them once the listing has completed
+    fetched_at = time.time()
+    items = []
+    for item in _iter_items(service, folder_id, recursive, fields, query, file_fields, start_depth = start_depth):
+        items.append(item)
+        yield item
 
-def _copy_items_bfs(service, source_folder_id, destination_folder_id):
+    with closing(sqlite3.connect(LISTING_CACHE_FILEPATH)) as connection:
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO listings (key, fetched_at, items) VALUES (?, ?, ?)", (key, fetched_at, orjson.dumps(items)))
+
+# Internal function to count the items in the specified Google Drive folder that match a query.
+def _count_matching(service: build, folder_id: str, query: str) -> int:
+    '''
+    Internal function to count the items in the specified Google Drive folder that match a query, requesting only the
+    smallest field (`id`) for each item so that no other file metadata is transferred.
+
+    Args:
+        service: The Google Drive API service.
+        folder_id: The ID of the Google Drive folder to count items in.
+        query: The query clause to filter the counted items by (e.g. `mimeType = '...'`).
+
+    Returns:
+        The number of matching items in the folder.
+    '''
+
+    return sum(1 for _ in _iter_cached_items(service, folder_id, fields = "nextPageToken, files(id)", query = query))
+
+# Internal function to copy items from the source Google Drive folder to the destination Google Drive folder.
+def _copy_items_bfs(service: build, source_folder_id: str, destination_folder_id: str) -> dict:
     '''
     Internal function to copy items from the source Google Drive folder to the destination Google Drive folder, using a breadth-first search (BFS) approach.
 
+    Destination IDs for new folders are pre-allocated with `files().generateIds()` as the folders are listed, so their
+    own items can be listed straight away rather than after the folders have been created. Queued folders' items are
+    listed together, with each folder's items being submitted in copy batches to the shared copy workers as soon as
+    they're listed, or as soon as their destination folder has been created if it doesn't exist yet.
+
     Args:
         service: The Google Drive API service.
         source_folder_id: The ID of the source Google Drive folder.
         destination_folder_id: The ID of the destination Google Drive folder.
         
     Returns:
-        A dictionary containing the number of files and folders copied.
+        A dictionary containing the number of files and folders copied, and the number of items that may not have been
+        copied because of errors (including the items in folders that couldn't be created).
 
     Raises:
-        HttpError: An error occurred accessing the Google Drive API.
+        HttpError: The Google Drive API rejected a batch request (other than for a rate limit error, which is retried).
     '''
 
+    creds = service._http.credentials
+    files_resource = service.files()
+    files_create = files_resource.create
+    files_copy = files_resource.copy
+    files_generate_ids = files_resource.generateIds
+    lock = threading.Lock()
     copied_folder_count = 0
     copied_file_count = 0
-
-    # Initialize a double-ended queue with the top-level source and destination folder IDs
-    queue = deque([tuple((source_folder_id, destination_folder_id))])
-
-    # Process top-level and all nested folders one level at a time
-    while queue:
-        # Store the length (breadth) of the current level before we start processing
-        level_breadth = len(queue)
-        logger.debug(f"----Starting new level with breadth {level_breadth} ----")
-
-        # Reset folder_id_map for each level
-        folder_id_map = {}
-
-        # Callback function to handle each batch request response
-        def handle_batch_response(request_id, response, exception):
-            nonlocal copied_file_count, copied_folder_count
-            if exception:
-                logger.error(f"An error occurred: {exception}")
-            else:
-                # Check if the response is a folder or file and update counts
-                if 'mimeType' in response and response['mimeType'] == 'application/vnd.google-apps.folder':
+    skipped_item_count = 0
+
+    # Initialize a double-ended queue of (source folder ID, destination folder ID, depth) tuples to process with the
+    # top-level source and destination folder IDs
+    queue = deque([(source_folder_id, destination_folder_id, 0)])
+
+    # Pre-allocated destination IDs for new folders, keyed by source folder ID, along with a pool of unused IDs
+    new_folder_ids = {}
+    generated_ids = deque()
+
+    # Destination folders that exist, and the chunks of items waiting on the others to be created. Newly created folder
+    # IDs are collected on the worker threads until the waiting chunks are submitted.
+    existing_folder_ids = {destination_folder_id}
+    waiting_chunks = {}
+    waiting_chunk_count = 0
+    created_folder_ids = []
+
+    # Callback function to handle each batch request response (called from the worker threads)
+    def handle_batch_response(request_id, response, exception, batch_results):
+        nonlocal copied_file_count, copied_folder_count, skipped_item_count
+        if exception:
+            # Individual requests in a batch can be rate limited on their own, so keep those to be retried
+            if isinstance(exception, HttpError) and _is_retryable_error(exception):
+                batch_results['failed_requests'].append((request_id, exception))
+            elif isinstance(exception, HttpError) and exception.resp.status == 409 and request_id in new_folder_ids:
+                # A retried folder creation conflicting with its pre-allocated ID means an earlier attempt succeeded
+                batch_results['folder_count'] += 1
+                with lock:
                     copied_folder_count += 1
-                    logger.info(f"Folder copied: {response['name']} with new ID: {response['id']}")
-                    
-                    # Store mapping of source folder ID to new folder ID (to add to queue later)
-                    folder_id_map[request_id] = response['id']
-                else:
-                    copied_file_count += 1
-                    logger.info(f"File copied: {response['name']} with new ID: {response['id']}")
-
-        # Function to create a batch request for all items in a given folder
-        def create_batch_request(items, parent_id):
-            batch = service.new_batch_http_request(callback = handle_batch_response)
-            for item in items:
-                # For each item, add either a folder creation request or a copy request to the batch
-                if item['mimeType'] == 'application/vnd.google-apps.folder':
-                    folder_metadata = {
-                        'name': item['name'],
-                        'mimeType': 'application/vnd.google-apps.folder',
-                        'parents': [parent_id]
-                    }
-                    batch.add(service.files().create(body = folder_metadata, fields = 'id, name, mimeType'), request_id = item['id'])
-                else:
-                    file_metadata = {
-                        'name': item['name'],
-                        'parents': [parent_id]
-                    }
-                    batch.add(service.files().copy(fileId = item['id'], body = file_metadata, fields = 'id, name, mimeType'), request_id = item['id'])
-            return batch
-
-        # Process folders at the current level in parallel
-        with ThreadPoolExecutor(max_workers = min(MAX_WORKERS, level_breadth)) as executor:
-            futures = []
-            
-            # For each folder, retrieve its items and create a batch request to copy them
-            for _ in range(level_breadth):
-                src_id, dest_id = queue.popleft()
-                print (f"Processing source folder {src_id} and destination folder {dest_id}")
-                items = _list_items(service, src_id)
-                if items:
-                    logger.debug(f"Found {len(items)} items in folder {src_id}, creating batch requests.")
-                    for i in range(0, len(items), BATCH_SIZE):
-                        chunk = items[i:i + BATCH_SIZE]
-                        batch = create_batch_request(chunk, dest_id)
-                        futures.append(executor.submit(batch.execute))
-
-            # Wait for all batch requests to complete and handle exceptions
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as error:
-                    logger.error(f"An unexpected error occurred: {error}")
+                    created_folder_ids.append(new_folder_ids[request_id])
+            else:
+                logger.error(f"An error occurred: {exception}")
+                with lock:
+                    skipped_item_count += 1
+        else:
+            # Check if the response is a folder or file and update counts
+            new_id = response['id']
+            name = response.get('name', new_id)
+            is_folder = response.get('mimeType') == FOLDER_MIME
+            batch_results['folder_count'] += is_folder
+            batch_results['file_count'] += not is_folder
+            with lock:
+                copied_folder_count += is_folder
+                copied_file_count += not is_folder
+                if is_folder:
+                    # Record the new folder so the items waiting on it can be copied into it
+                    created_folder_ids.append(new_id)
+            logger.debug("%s copied: %s with new ID: %s", 'Folder' if is_folder else 'File', name, new_id)
+
+    # Function to create a batch request for a chunk of items in a given folder
+    def create_batch_request(items, parent_id, batch_results):
+        batch = service.new_batch_http_request(callback = partial(handle_batch_response, batch_results = batch_results))
+        folders = [item for item in items if item['mimeType'] == FOLDER_MIME]
+        files = [item for item in items if item['mimeType'] != FOLDER_MIME]
+
+        # Build the metadata shared by every item in the chunk once, copying it for each item (the request bodies are
+        # serialized when each request is created, so the shared parents list is never mutated)
+        parents = [parent_id]
+        folder_template = {'mimeType': FOLDER_MIME, 'parents': parents}
+        file_template = {'parents': parents}
+
+        # Add a folder creation request to the batch for each folder, using its pre-allocated ID
+        for item in folders:
+            folder_metadata = folder_template.copy()
+            folder_metadata['id'] = new_folder_ids[item['id']]
+            folder_metadata['name'] = item['name']
+            batch.add(files_create(body = folder_metadata, fields = _COPY_FIELDS), request_id = item['id'])
+
+        # Add a copy request to the batch for each file
+        for item in files:
+            file_metadata = file_template.copy()
+            file_metadata['name'] = item['name']
+            batch.add(files_copy(fileId = item['id'], body = file_metadata, fields = _COPY_FIELDS), request_id = item['id'])
+        return batch
 
-        # Ensure all futures have completed
-        for future in futures:
+    # Function to build and execute the batch request for a chunk of items on a worker thread, first waiting out the
+    # backoff delay if the chunk is being retried, and log a single progress message for the batch. Returns the
+    # (request ID, error) pairs of any individual requests in the batch that failed with a retryable error.
+    def copy_chunk(items, parent_id, delay):
+        if delay:
+            time.sleep(delay)
+        batch_results = {'file_count': 0, 'folder_count': 0, 'failed_requests': []}
+        _execute_batch(create_batch_request(items, parent_id, batch_results), creds)
+        logger.info(f"Copied {batch_results['file_count']} files and {batch_results['folder_count']} folders to folder: {parent_id}")
+        return batch_results['failed_requests']
+
+    # Copy batches in flight on the shared copy workers, mapped to their (items, new parent folder ID, attempt) so they
+    # can be retried
+    in_flight = {}
+
+    # Function to submit a chunk of items to the shared copy workers
+    def submit_chunk(items, parent_id, attempt = 0, delay = 0):
+        in_flight[_COPY_EXECUTOR.submit(copy_chunk, items, parent_id, delay)] = (items, parent_id, attempt)
+
+    # Function to wait for batches to complete while the copy workers have fallen behind, counting the chunks waiting on
+    # their destination folders as well as the batches in flight (only the latter can complete, so stop once none are)
+    def wait_for_capacity():
+        while in_flight and len(in_flight) + waiting_chunk_count >= MAX_QUEUED_BATCHES:
+            wait_for_batches()
+
+    # Function to submit a listed chunk of items once its destination folder exists. If the copy workers have fallen
+    # behind, this waits for batches to complete first, which also pauses the listing feeding it.
+    def submit_when_created(items, parent_id):
+        nonlocal waiting_chunk_count
+        wait_for_capacity()
+        if parent_id in existing_folder_ids:
+            submit_chunk(items, parent_id)
+        else:
+            waiting_chunks.setdefault(parent_id, []).append(items)
+            waiting_chunk_count += 1
+
+    # Function to pre-allocate the destination ID for a new folder
+    def allocate_folder_id(src_id):
+        if not generated_ids:
+            _PACER.acquire()
+            generated_ids.extend(files_generate_ids(count = 1000, space = 'drive').execute(num_retries = MAX_RETRIES)['ids'])
+        new_folder_ids[src_id] = generated_ids.popleft()
+        return new_folder_ids[src_id]
+
+    # Function to wait for any batch request to complete, retrying rate-limited chunks (or just their rate-limited
+    # requests) with backoff and submitting the chunks that were waiting on any folders created so far
+    def wait_for_batches():
+        nonlocal waiting_chunk_count, skipped_item_count
+        done, _ = wait(in_flight, return_when = FIRST_COMPLETED)
+        for future in done:
+            items, parent_id, attempt = in_flight.pop(future)
             try:
-                future.result()
+                failed_requests = future.result()
+            except HttpError as error:
+                if _is_retryable_error(error) and attempt + 1 < MAX_RETRIES:
+                    logger.warning("Rate limit exceeded. Retrying after a delay...")
+                    submit_chunk(items, parent_id, attempt + 1, _get_backoff_delay(attempt, error))
+                    continue
+
+                # A whole batch being rejected by the API for any other reason (e.g. lost authorization or a missing
+                # destination folder) will fail every other batch too, so cancel the queued batches and stop copying
+                logger.error(f"An error occurred while copying items to folder {parent_id}: {error}")
+                for pending_future in in_flight:
+                    pending_future.cancel()
+                raise
+            except (SSLError, TimeoutError, ConnectionError) as error:
+                # A connection error only affects this batch. Its folder creations are retried (a repeated creation
+                # conflicts with the folder's pre-allocated ID rather than creating a duplicate), but its file copies
+                # may already have been made, so they're counted as skipped (possibly not copied) rather than risking
+                # duplicates.
+                folders = [item for item in items if item['mimeType'] == FOLDER_MIME]
+                skipped_file_count = len(items) - len(folders)
+                if skipped_file_count:
+                    logger.error(f"A connection error occurred while copying {skipped_file_count} files to folder {parent_id}, which may not have been copied: {error}")
+                    skipped_item_count += skipped_file_count
+                if folders:
+                    if attempt + 1 < MAX_RETRIES:
+                        logger.warning(f"A connection error occurred while creating folders in folder {parent_id}: {error}. Retrying after a delay...")
+                        submit_chunk(folders, parent_id, attempt + 1, _get_backoff_delay(attempt, error))
+                    else:
+                        logger.error(f"Failed to create {len(folders)} folders in folder {parent_id} after {MAX_RETRIES} attempts: {error}")
+                        skipped_item_count += len(folders)
+                continue
             except Exception as error:
-                logger.error(f"An error occurred while ensuring futures completion: {error}")
+                logger.error(f"An unexpected error occurred while copying {len(items)} items to folder {parent_id}: {error}")
+                skipped_item_count += len(items)
+                continue
+
+            if failed_requests:
+                if attempt + 1 < MAX_RETRIES:
+                    logger.warning(f"Rate limit exceeded for {len(failed_requests)} items. Retrying after a delay...")
+                    failed_ids = {request_id for request_id, _ in failed_requests}
+                    retry_delay = max(_get_backoff_delay(attempt, error) for _, error in failed_requests)
+                    submit_chunk([item for item in items if item['id'] in failed_ids], parent_id, attempt + 1, retry_delay)
+                else:
+                    for _, error in failed_requests:
+                        logger.error(f"An error occurred: {error}")
+                    skipped_item_count += len(failed_requests)
+
+        # Submit the chunks that were waiting on the folders created so far
+        with lock:
+            new_folder_ids_created = created_folder_ids[:]
+            created_folder_ids.clear()
+        for new_id in new_folder_ids_created:
+            existing_folder_ids.add(new_id)
+            for items in waiting_chunks.pop(new_id, []):
+                waiting_chunk_count -= 1
+                submit_chunk(items, new_id)
+
+    while queue or in_flight:
+        # Retrieve the items of every queued folder together, submitting them grouped by parent folder in chunks of the
+        # configured batch size as they're listed, and queueing nested folders to be listed next
+        if queue:
+            folder_map = {}
+            while queue:
+                src_id, dest_id, depth = queue.popleft()
+                logger.debug("Processing source folder %s and destination folder %s", src_id, dest_id)
+                folder_map[src_id] = (dest_id, depth + 1)
+
+            items_by_parent = {src_id: [] for src_id in folder_map}
+            for item in _iter_items(service, list(folder_map), fields = "nextPageToken, files(name, id, mimeType, parents)", order_by = 'folder'):
+                for parent_id in item['parents']:
+                    if parent_id in items_by_parent:
+                        dest_id, child_depth = folder_map[parent_id]
+                        if item['mimeType'] == FOLDER_MIME:
+                            new_id = allocate_folder_id(item['id'])
+                            if child_depth > MAX_RECURSION_DEPTH:
+                                logger.warning(f"Max recursion depth reached for folder: {item['id']}")
+                            else:
+                                queue.append((item['id'], new_id, child_depth))
+
+                        items = items_by_parent[parent_id]
+                        items.append(item)
+                        if len(items) >= BATCH_SIZE:
+                            submit_when_created(items, dest_id)
+                            items_by_parent[parent_id] = []
+                        break
+
+            for src_id, items in items_by_parent.items():
+                if items:
+                    submit_when_created(items, folder_map[src_id][0])
 
-        # Debug output to verify folder_id_map contents
-        logger.debug(f"folder_id_map: {folder_id_map}")
+        # Wait for any batch request to complete, then for enough to complete that the next level can be listed
+        wait_for_batches()
+        wait_for_capacity()
 
-        # Add nested folders that were just created to the queue for processing of the next level down
-        queue.extend((src_id, new_dest_id) for src_id, new_dest_id in folder_id_map.items())
+    # Any chunks still waiting belong to folders that couldn't be created
+    for parent_id, chunks in waiting_chunks.items():
+        waiting_item_count = sum(len(items) for items in chunks)
+        logger.error(f"Skipped copying {waiting_item_count} items to folder {parent_id}, which couldn't be created")
+        skipped_item_count += waiting_item_count
 
-    return {'source_folder_id': source_folder_id, 'destination_folder_id': destination_folder_id, 'copied_file_count': copied_file_count, 'copied_folder_count': copied_folder_count}
+    if skipped_item_count:
+        logger.error(f"The copy is incomplete: {skipped_item_count} items may not have been copied")
+
+    return {'source_folder_id': source_folder_id, 'destination_folder_id': destination_folder_id, 'copied_file_count': copied_file_count, 'copied_folder_count': copied_folder_count, 'skipped_item_count': skipped_item_count}
 
 def _output_results(results: dict, export_csv: Optional[str] = None, index_name: Optional[str] = None) -> None:
     '''
@@ -447,16 +984,12 @@ def count_source_items_by_type(export_csv: Optional[str] = None) -> dict:
     logger.debug(f"Source folder ID: {SOURCE_FOLDER_ID}")
     logger.debug(f"Destination folder ID: {DESTINATION_FOLDER_ID}")
 
-    creds = _init_google_oauth()
-    service = build("drive", "v3", credentials = creds)
-
-    # List the items in the source folder
-    items = _list_items(service, SOURCE_FOLDER_ID)
+    service = _get_service()
 
-    # Count the number of files and folders
-    total_count = len(items)
-    folder_count = Counter([item['mimeType'] for item in items])['application/vnd.google-apps.folder']
-    file_count = total_count - folder_count
+    # Count the number of files and folders by filtering on mime type in the query
+    folder_count = _count_matching(service, SOURCE_FOLDER_ID, f"mimeType = '{FOLDER_MIME}'")
+    file_count = _count_matching(service, SOURCE_FOLDER_ID, f"mimeType != '{FOLDER_MIME}'")
+    total_count = file_count + folder_count
 
     item_counts = {'source_folder_id': SOURCE_FOLDER_ID,'file_count': file_count, 'folder_count': folder_count}
     logger.debug(f"Total items: {total_count} - Files: {file_count}, Folders: {folder_count}")
@@ -480,31 +1013,43 @@ def count_source_child_items_by_folder(export_csv: Optional[str] = None) -> dict
     logger.debug(f"Source folder ID: {SOURCE_FOLDER_ID}")
     logger.debug(f"Destination folder ID: {DESTINATION_FOLDER_ID}")
 
-    creds = _init_google_oauth()
-    service = build("drive", "v3", credentials = creds)
-
-    # List the top-level items in the source folder and filter to folders
-    items = _list_items(service, SOURCE_FOLDER_ID)
-    folders = [item for item in items if item['mimeType'] == 'application/vnd.google-apps.folder']
+    service = _get_service()
 
-    # Count the number of files and folders in each folder
+    # Walk the whole source tree in a single concurrent listing so nested folders are listed as soon as their parent's
+    # page arrives, attributing each nested item to the top-level folder it's under (a child's top-level ancestor is
+    # its parent's top-level ancestor; folders are always listed before their contents). The source folder is listed at
+    # depth -1 so the depth limit applies from each top-level folder, as if it were listed on its own.
+    folders = []
+    top_level_file_count = 0
     folder_counts = {}
-    for folder in folders:
-        logger.debug(f"Processing folder: {folder['name']}...")
-        folder_items = _list_items(service, folder['id'], recursive = True)
+    ancestor_of = {}
+    for item in _iter_cached_items(service, SOURCE_FOLDER_ID, recursive = True, fields = "nextPageToken, files(id, name, mimeType, parents)", file_fields = "nextPageToken, files(mimeType, parents)", start_depth = -1):
+        is_folder = item['mimeType'] == FOLDER_MIME
+        if SOURCE_FOLDER_ID in item['parents']:
+            if is_folder:
+                folders.append(item)
+                folder_counts[item['id']] = {'folder_name': item['name'], 'child_items_count': 0, 'child_file_count': 0, 'child_folder_count': 0}
+                ancestor_of[item['id']] = item['id']
+            else:
+                top_level_file_count += 1
+            continue
+
+        ancestor_id = next(ancestor_of[parent_id] for parent_id in item['parents'] if parent_id in ancestor_of)
+        counts = folder_counts[ancestor_id]
+        counts['child_items_count'] += 1
+        if is_folder:
+            ancestor_of[item['id']] = ancestor_id
+            counts['child_folder_count'] += 1
+        else:
+            counts['child_file_count'] += 1
 
-        # Count the number of files and folders
-        total_count = len(folder_items)
-        folder_count = Counter([folder_item['mimeType'] for folder_item in folder_items])['application/vnd.google-apps.folder']
-        file_count = total_count - folder_count
+    for folder in folders:
+        counts = folder_counts[folder['id']]
+        logger.debug(f"Folder ID: {folder['id']} - Folder Name: {folder['name']} - Child Items: {counts['child_items_count']} (Files: {counts['child_file_count']}, Folders: {counts['child_folder_count']})")
 
-        # Store the counts for the current folder
-        logger.debug(f"Folder ID: {folder['id']} - Folder Name: {folder['name']} - Child Items: {total_count} (Files: {file_count}, Folders: {folder_count})")
-        folder_counts[folder['id']] = {'folder_name': folder['name'], 'child_items_count': total_count, 'child_file_count': file_count, 'child_folder_count': folder_count}
-        
     # Store the total count of all folders under the source folder (top-level folders + all nested folders)
-    total_nested_file_count = sum([len(items) - len(folders)] + [folder['child_file_count'] for folder in folder_counts.values()])
-    total_nested_folder_count = sum([len(folders)] + [folder['child_folder_count'] for folder in folder_counts.values()])
+    total_nested_file_count = top_level_file_count + sum(folder['child_file_count'] for folder in folder_counts.values())
+    total_nested_folder_count = len(folders) + sum(folder['child_folder_count'] for folder in folder_counts.values())
     folder_counts['(totals)'] = {'folder_name': '', 'child_items_count': total_nested_file_count + total_nested_folder_count, 'child_file_count': total_nested_file_count, 'child_folder_count': total_nested_folder_count}
     logger.debug(f"Total nested items count (including top-level) - {total_nested_file_count + total_nested_folder_count} (Files: {total_nested_file_count}, Folders: {total_nested_folder_count})")
 
@@ -518,26 +1063,23 @@ def copy_source_items_to_dest_folder(bfs: Optional[bool] = None, export_csv: Opt
     Copy all files from the source Google Drive folder to the destination Google Drive folder, including nested files and folders.
 
     Args:
-        bfs: A flag to indicate whether to copy items using a breadth-first search (BFS) approach. (EXPERIMENTAL)
+        bfs: Deprecated and ignored; items are always copied using a breadth-first search (BFS) approach.
         export_csv: The relative path to export the results to as a CSV file.
 
     Returns:
-        A dictionary containing the number of files and folders copied to the destination folder.
+        A dictionary containing the number of files and folders copied to the destination folder, and the number of
+        items that may not have been copied because of errors.
     '''
     logger.info("Assessment #3 - Copying the content of the source folder to the destination folder...")
     logger.debug(f"Source folder ID: {SOURCE_FOLDER_ID}")
     logger.debug(f"Destination folder ID: {DESTINATION_FOLDER_ID}")
 
-    creds = _init_google_oauth(scopes = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/drive.metadata.readonly'])
-    service = build("drive", "v3", credentials = creds)
+    service = _get_service(scopes = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/drive.metadata.readonly'])
 
     # Start copying from the source folder to the destination folder
-    if bfs:
-        logger.info("BFS flag set, using experimental breadth-first search method.")
-        copied_item_counts = _copy_items_bfs(service, SOURCE_FOLDER_ID, DESTINATION_FOLDER_ID)
-    else:
-        logger.info("Using default recursive copy method (DFS).")
-        copied_item_counts = _copy_items(service, SOURCE_FOLDER_ID, DESTINATION_FOLDER_ID, recursive = True)
+    if bfs is not None:
+        logger.warning("The bfs parameter is deprecated and ignored; items are always copied breadth-first.")
+    copied_item_counts = _copy_items_bfs(service, SOURCE_FOLDER_ID, DESTINATION_FOLDER_ID)
 
     # Output the results
     _output_results(copied_item_counts, export_csv = export_csv)